@@ -0,0 +1,67 @@
+"""Maintenance job moving inactive chats and departed members to archive tables"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from bot.config import config
+from bot.database import db
+
+logger = logging.getLogger(__name__)
+
+
+async def archive_once() -> tuple:
+    """
+    Archive inactive chats and departed members in batches
+    Returns: (archived chats, archived memberships)
+    """
+    inactive_since = datetime.now() - timedelta(days=config.ARCHIVE_INACTIVE_DAYS)
+
+    chats = 0
+    while True:
+        count = await db.archive_inactive_chats(inactive_since, config.ARCHIVE_BATCH)
+        chats += count
+        if count < config.ARCHIVE_BATCH:
+            break
+
+    members = 0
+    while True:
+        count = await db.archive_departed_members(config.ARCHIVE_BATCH)
+        members += count
+        if count < config.ARCHIVE_BATCH:
+            break
+
+    logger.info(f"Archived {chats} chat(s) and {members} departed membership(s)")
+    return chats, members
+
+
+class ArchiveJob:
+    """Runs archive_once() every ARCHIVE_INTERVAL seconds"""
+
+    def __init__(self, interval: float = config.ARCHIVE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            try:
+                await archive_once()
+            except Exception as e:
+                logger.error(f"Archive job error: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Start background archiving"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop background archiving"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
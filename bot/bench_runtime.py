@@ -0,0 +1,187 @@
+"""Benchmark Bot API client runtimes against a local fake Bot API server
+
+Compares the stock runtime (asyncio loop, json) with uvloop + orjson. Neither
+is a dependency of the bot, as they showed no reproducible gain here;
+install them to rerun the comparison.
+The fake server runs in its own process with the stock event loop, so the
+runtime under test only changes the client. Besides throughput and latency
+the client's CPU time per request is reported: on a machine with few cores
+client and server still compete for CPU, and CPU time is what the runtime
+actually saves. Runtimes are run in turns for a few rounds and each round
+is reported, to show the spread.
+Usage: python -m bot.bench_runtime [requests] [concurrency] [rounds]
+"""
+
+import asyncio
+import multiprocessing
+import socket
+import statistics
+import sys
+import time
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+FAKE_TOKEN = "42:TEST"
+HOST = "127.0.0.1"
+PORT = 8089
+UPDATES_PER_BATCH = 100
+
+RUNTIME_STOCK = "stock"
+RUNTIME_FAST = "uvloop+orjson"
+
+
+def make_updates(count: int) -> list:
+    """Build a batch of fake message updates"""
+    return [
+        {
+            "update_id": i,
+            "message": {
+                "message_id": i,
+                "date": 1700000000,
+                "chat": {"id": -100500, "type": "supergroup", "title": "Тестовый чат"},
+                "from": {"id": 1000 + i, "is_bot": False, "first_name": "Игрок", "username": f"user{i}"},
+                "text": "/run",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 4}],
+            },
+        }
+        for i in range(count)
+    ]
+
+
+def serve_fake_api():
+    """Run fake Bot API server answering getUpdates and sendMessage (in a child process)"""
+    updates = {"ok": True, "result": make_updates(UPDATES_PER_BATCH)}
+    sent = {
+        "ok": True,
+        "result": {
+            "message_id": 1,
+            "date": 1700000000,
+            "chat": {"id": -100500, "type": "supergroup"},
+            "text": "ok",
+        },
+    }
+
+    async def handle(request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        await request.read()
+        return web.json_response(updates if method == "getUpdates" else sent)
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", handle)
+    web.run_app(app, host=HOST, port=PORT, access_log=None, print=None)
+
+
+def wait_for_server(timeout: float = 10):
+    """Wait until fake server accepts connections"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection((HOST, PORT), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def _orjson_dumps(obj) -> str:
+    """orjson returns bytes, aiogram expects str"""
+    return orjson.dumps(obj).decode()
+
+
+def create_session(runtime: str, api: TelegramAPIServer) -> AiohttpSession:
+    """Create Bot API session with the JSON codecs of runtime"""
+    if runtime == RUNTIME_FAST:
+        return AiohttpSession(api=api, json_loads=orjson.loads, json_dumps=_orjson_dumps)
+    return AiohttpSession(api=api)
+
+
+async def run_runtime(runtime: str, total: int, concurrency: int) -> dict:
+    """Run getUpdates/sendMessage mix and collect latencies"""
+    api = TelegramAPIServer.from_base(f"http://{HOST}:{PORT}")
+    bot = Bot(token=FAKE_TOKEN, session=create_session(runtime, api))
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            if i % 10 == 0:
+                await bot.get_updates(offset=i, timeout=0)
+            else:
+                await bot.send_message(chat_id=-100500, text=f"Сообщение {i}")
+            latencies.append(time.perf_counter() - start)
+
+    try:
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        cpu = time.process_time() - cpu_started
+        elapsed = time.perf_counter() - started
+    finally:
+        await bot.session.close()
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "cpu": cpu / total * 1e6,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+
+    runtimes = [RUNTIME_STOCK]
+    if uvloop is not None and orjson is not None:
+        runtimes.append(RUNTIME_FAST)
+    else:
+        print("uvloop or orjson is not installed, measuring the stock runtime only")
+
+    server = multiprocessing.get_context("spawn").Process(target=serve_fake_api, daemon=True)
+    server.start()
+    try:
+        wait_for_server()
+        results = {runtime: [] for runtime in runtimes}
+        for round_no in range(1, rounds + 1):
+            for runtime in runtimes:
+                asyncio.set_event_loop_policy(uvloop.EventLoopPolicy() if runtime == RUNTIME_FAST else None)
+                result = asyncio.run(run_runtime(runtime, total, concurrency))
+                results[runtime].append(result)
+                print(
+                    f"round {round_no} {runtime:>13}: {result['rps']:8.0f} req/s, "
+                    f"cpu {result['cpu']:.0f} us/req, "
+                    f"p50 {result['p50']:.2f} ms, p99 {result['p99']:.2f} ms"
+                )
+
+        for runtime, runs in results.items():
+            print(
+                f"median  {runtime:>13}: "
+                f"{statistics.median(r['rps'] for r in runs):8.0f} req/s, "
+                f"cpu {statistics.median(r['cpu'] for r in runs):.0f} us/req, "
+                f"p50 {statistics.median(r['p50'] for r in runs):.2f} ms, "
+                f"p99 {statistics.median(r['p99'] for r in runs):.2f} ms"
+            )
+    finally:
+        server.terminate()
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""Benchmark pool checkouts and latency of run_game/registration with and without unit of work
+
+Needs the configured PostgreSQL. Seeds throwaway chats with a realistic number of
+players each and removes them afterwards. Calls go to random chats, so they do
+not all queue on one chats row, and concurrency defaults to the pool size.
+Only successful calls are counted. Modes run in turns for a few rounds, the
+first one alternating, and medians over rounds are reported.
+Usage: python -m bot.bench_uow [iterations] [concurrency] [chats] [players] [rounds]
+"""
+
+import asyncio
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, event, func, insert, select
+
+from bot.database import db, UnitOfWork
+from bot.draw_rules import choose_winner
+from bot.models import Chat, ChatUser, User
+
+BENCH_CHAT_ID_BASE = -999000000000
+BENCH_USER_ID_BASE = 999000000000
+# Registered by the benchmark, above the seeded players
+BENCH_NEW_USER_ID_BASE = BENCH_USER_ID_BASE + 10_000_000
+BENCH_CHAT_ID_MIN = BENCH_CHAT_ID_BASE - 100_000
+
+
+class CheckoutCounter:
+    """Counts connection checkouts from the engine pool"""
+
+    def __init__(self):
+        self.count = 0
+        event.listen(db.engine.sync_engine.pool, "checkout", self._on_checkout)
+
+    def _on_checkout(self, *args):
+        self.count += 1
+
+
+async def seed(chats: int, players: int):
+    """Create benchmark chats with players"""
+    chat_ids = [BENCH_CHAT_ID_BASE - i for i in range(chats)]
+    async with db.async_session() as session:
+        await session.execute(insert(Chat), [{"chat_id": chat_id} for chat_id in chat_ids])
+        await session.execute(insert(User), [
+            {"user_id": BENCH_USER_ID_BASE + i, "username": f"bench{i}", "firstname": "Bench"}
+            for i in range(chats * players)
+        ])
+        await session.execute(insert(ChatUser), [
+            {"chat_id": chat_id, "user_id": BENCH_USER_ID_BASE + n * players + i}
+            for n, chat_id in enumerate(chat_ids)
+            for i in range(players)
+        ])
+        await session.commit()
+    return chat_ids
+
+
+async def run_game_path(chat_id: int, day: int, uow: Optional[UnitOfWork]) -> bool:
+    """Database calls of a /run that draws a winner, as in handlers.run_game"""
+    await db.is_same_day_running(chat_id, day, "user_of_the_day", uow=uow)
+    players = await db.get_players(chat_id, uow=uow)
+    if not players:
+        return False
+    rules = await db.get_draw_rules(uow=uow)
+    user = choose_winner(players, rules.lookup(chat_id, "user_of_the_day", day))
+    await db.set_winner(chat_id, user.user_id, user.get_stats_name(), day, "user_of_the_day", uow=uow)
+    if uow is not None:
+        await uow.commit()
+    return True
+
+
+async def registration_path(chat_id: int, user_id: int, uow: Optional[UnitOfWork]) -> bool:
+    """Database calls of a /reg"""
+    success, _ = await db.registration(chat_id, user_id, f"bench{user_id}", "Bench", uow=uow)
+    if uow is not None:
+        await uow.commit()
+    return success
+
+
+async def games_played() -> int:
+    """Sum of user_day counters in benchmark chats, set_winner only logs its errors"""
+    async with db.async_session() as session:
+        result = await session.execute(
+            select(func.coalesce(func.sum(ChatUser.user_day_counter), 0))
+            .where(ChatUser.chat_id.between(BENCH_CHAT_ID_MIN, BENCH_CHAT_ID_BASE))
+        )
+        return result.scalar_one()
+
+
+async def measure(
+    name: str,
+    make_call,
+    iterations: int,
+    concurrency: int,
+    counter: CheckoutCounter
+) -> Optional[Tuple[float, float, float]]:
+    """
+    Run calls concurrently and print checkouts per call and latencies
+    of successful calls
+    Returns (checkouts/op, p50 ms, p99 ms), None if all calls failed.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            if await make_call(i):
+                latencies.append(time.perf_counter() - started)
+
+    checkouts = counter.count
+    await asyncio.gather(*(one(i) for i in range(iterations)))
+    checkouts = counter.count - checkouts
+
+    if not latencies:
+        print(f"{name:>22}: all {iterations} calls failed")
+        return None
+
+    latencies.sort()
+    result = (
+        checkouts / iterations,
+        statistics.median(latencies) * 1000,
+        latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000,
+    )
+    print(
+        f"{name:>22}: {result[0]:.2f} checkouts/op, p50 {result[1]:.2f} ms, p99 {result[2]:.2f} ms"
+        + (f", {iterations - len(latencies)} failed" if len(latencies) < iterations else "")
+    )
+    return result
+
+
+async def cleanup():
+    """Remove benchmark chats and users"""
+    async with db.async_session() as session:
+        await session.execute(
+            delete(ChatUser).where(ChatUser.chat_id.between(BENCH_CHAT_ID_MIN, BENCH_CHAT_ID_BASE))
+        )
+        await session.execute(delete(Chat).where(Chat.chat_id.between(BENCH_CHAT_ID_MIN, BENCH_CHAT_ID_BASE)))
+        await session.execute(delete(User).where(User.user_id >= BENCH_USER_ID_BASE))
+        await session.commit()
+
+
+async def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else db.engine.pool.size()
+    chats = int(sys.argv[3]) if len(sys.argv) > 3 else 500
+    players = int(sys.argv[4]) if len(sys.argv) > 4 else 15
+    rounds = int(sys.argv[5]) if len(sys.argv) > 5 else 3
+
+    await db.init_db()
+    await cleanup()
+    chat_ids = await seed(chats, players)
+    print(f"{chats} chats x {players} players, {iterations} ops, concurrency {concurrency}")
+
+    counter = CheckoutCounter()
+    results: Dict[str, List[Tuple[float, float, float]]] = {}
+    random.seed(0)
+    offset = 0
+    try:
+        # Warm up pool and draw rules cache
+        await run_game_path(chat_ids[0], 0, None)
+
+        for round_no in range(rounds):
+            print(f"round {round_no + 1}")
+            modes = ((False, ""), (True, " (uow)"))
+            for uow, suffix in modes if round_no % 2 == 0 else reversed(modes):
+                base = offset
+                offset += iterations
+                result = await measure(
+                    "registration" + suffix,
+                    lambda i: registration_path(
+                        random.choice(chat_ids),
+                        BENCH_NEW_USER_ID_BASE + base + i,
+                        db.unit_of_work() if uow else None
+                    ),
+                    iterations, concurrency, counter
+                )
+                if result is not None:
+                    results.setdefault("registration" + suffix, []).append(result)
+
+                played = await games_played()
+                result = await measure(
+                    "run_game" + suffix,
+                    lambda i: run_game_path(
+                        random.choice(chat_ids),
+                        1 + base + i,
+                        db.unit_of_work() if uow else None
+                    ),
+                    iterations, concurrency, counter
+                )
+                played = await games_played() - played
+                if played != iterations:
+                    print(f"{'run_game' + suffix:>22}: only {played} of {iterations} winners saved")
+                elif result is not None:
+                    results.setdefault("run_game" + suffix, []).append(result)
+
+        print("median over rounds")
+        for name in sorted(results):
+            runs = results[name]
+            print(
+                f"{name:>22}: {statistics.median(r[0] for r in runs):.2f} checkouts/op, "
+                f"p50 {statistics.median(r[1] for r in runs):.2f} ms, "
+                f"p99 {statistics.median(r[2] for r in runs):.2f} ms"
+            )
+    finally:
+        await cleanup()
+        await db.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
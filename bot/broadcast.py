@@ -0,0 +1,214 @@
+"""Rate-limited broadcast to all registered chats"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from typing import List, Optional, Set, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+from bot.config import config
+from bot.database import db
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = 3
+RETRY_DELAY = 60  # seconds before restarting a failed job
+
+
+class RateLimiter:
+    """Global limiter spacing out requests evenly to `rate` per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait for the next free slot"""
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float):
+        """Hold all requests for `seconds` (after flood wait from Telegram)"""
+        self._next_slot = max(self._next_slot, time.monotonic() + seconds)
+
+
+class Broadcaster:
+    """
+    Runs broadcast jobs in the background
+    Chat IDs are read in keyset-paginated batches, sent by a bounded pool
+    of workers sharing one global rate limiter, and delivery results are
+    stored per chat, so an interrupted job resumes where it stopped.
+    Results are saved every BROADCAST_FLUSH_INTERVAL seconds or
+    BROADCAST_FLUSH_SIZE sends, and once more when the job stops, even
+    by cancellation. A job failing with an error is restarted after
+    RETRY_DELAY seconds.
+    A chat gets a single message per job, so per-chat limits only come
+    into play through RetryAfter, which is honoured before retrying.
+    """
+
+    def __init__(self):
+        self._tasks: Set[asyncio.Task] = set()
+
+    def start(self, bot: Bot, job_id: int, text: str, author_id: int):
+        """Run broadcast job in background"""
+        # Clean context: a job started from a profiled update must not report into it
+        task = asyncio.create_task(
+            self._supervise(bot, job_id, text, author_id),
+            context=contextvars.Context()
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def stop(self):
+        """Cancel running jobs, saving their progress"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def resume(self, bot: Bot):
+        """Resume jobs interrupted by restart"""
+        for job in await db.get_running_broadcasts():
+            logger.info(f"Resuming broadcast #{job.id}")
+            self.start(bot, job.id, job.text, job.author_id)
+
+    async def _supervise(self, bot: Bot, job_id: int, text: str, author_id: int):
+        """Run job, restarting it after errors"""
+        while True:
+            try:
+                await self.run(bot, job_id, text, author_id)
+                return
+            except Exception as e:
+                logger.error(f"Broadcast #{job_id} failed: {e}, retrying in {RETRY_DELAY}s")
+                await asyncio.sleep(RETRY_DELAY)
+
+    async def run(self, bot: Bot, job_id: int, text: str, author_id: int):
+        """Send job text to every chat that has not received it yet"""
+        limiter = RateLimiter(config.BROADCAST_RATE)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=config.BROADCAST_WORKERS * 2)
+        results: List[Tuple[int, str, Optional[str]]] = []
+        flush_needed = asyncio.Event()
+        handled = 0
+
+        tasks = [
+            asyncio.create_task(self._worker(bot, queue, limiter, text, results, flush_needed))
+            for _ in range(config.BROADCAST_WORKERS)
+        ]
+        tasks.append(asyncio.create_task(self._flusher(job_id, results, flush_needed)))
+        started = time.monotonic()
+        try:
+            after_chat_id = None
+            while True:
+                chat_ids = await db.get_broadcast_chats(job_id, after_chat_id, config.BROADCAST_BATCH)
+                if not chat_ids:
+                    break
+                for chat_id in chat_ids:
+                    await queue.put(chat_id)
+                after_chat_id = chat_ids[-1]
+                handled += len(chat_ids)
+
+            await queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._save(job_id, results)
+
+        elapsed = time.monotonic() - started
+        counts = await db.finish_broadcast(job_id)
+        sent, failed = counts.get("sent", 0), counts.get("failed", 0)
+        report = (
+            f"Рассылка #{job_id} завершена: отправлено {sent}, ошибок {failed}. "
+            f"Этот запуск: {handled} чатов за {elapsed:.1f} с "
+            f"({handled / elapsed if elapsed else 0:.1f} сообщ./с)"
+        )
+        logger.info(report)
+        try:
+            await bot.send_message(author_id, report)
+        except TelegramAPIError as e:
+            logger.error(f"Error sending broadcast report: {e}")
+
+    async def _save(self, job_id: int, results: List[Tuple[int, str, Optional[str]]]):
+        """Save collected delivery results, keeping them on failure"""
+        batch, results[:] = results[:], []
+        try:
+            await db.save_broadcast_deliveries(job_id, batch)
+        except BaseException:
+            results[:0] = batch
+            raise
+
+    async def _flusher(
+        self,
+        job_id: int,
+        results: List[Tuple[int, str, Optional[str]]],
+        flush_needed: asyncio.Event
+    ):
+        """Save delivery results periodically or when enough pile up"""
+        while True:
+            try:
+                await asyncio.wait_for(flush_needed.wait(), timeout=config.BROADCAST_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            flush_needed.clear()
+            try:
+                await self._save(job_id, results)
+            except Exception as e:
+                logger.error(f"Error saving broadcast #{job_id} progress: {e}")
+
+    async def _worker(
+        self,
+        bot: Bot,
+        queue: asyncio.Queue,
+        limiter: RateLimiter,
+        text: str,
+        results: List[Tuple[int, str, Optional[str]]],
+        flush_needed: asyncio.Event
+    ):
+        """Take chat IDs from queue and send message to each"""
+        while True:
+            chat_id = await queue.get()
+            try:
+                try:
+                    result = await self._send(bot, limiter, chat_id, text)
+                except Exception as e:
+                    # E.g. ClientDecodeError on a proxy error page; a dead worker would stall the job
+                    logger.error(f"Broadcast to chat {chat_id} failed: {e!r}")
+                    result = chat_id, "failed", repr(e)[:255]
+                results.append(result)
+                if len(results) >= config.BROADCAST_FLUSH_SIZE:
+                    flush_needed.set()
+            finally:
+                queue.task_done()
+
+    async def _send(
+        self,
+        bot: Bot,
+        limiter: RateLimiter,
+        chat_id: int,
+        text: str
+    ) -> Tuple[int, str, Optional[str]]:
+        """Send message to chat, returns (chat_id, status, error)"""
+        for _ in range(MAX_RETRIES):
+            await limiter.acquire()
+            try:
+                # Admin text is sent as is, not as HTML
+                await bot.send_message(chat_id, text, parse_mode=None)
+                return chat_id, "sent", None
+            except TelegramRetryAfter as e:
+                logger.warning(f"Flood wait {e.retry_after}s for chat {chat_id}")
+                limiter.pause(e.retry_after)
+            except TelegramAPIError as e:
+                return chat_id, "failed", str(e)[:255]
+        return chat_id, "failed", "Too many flood waits"
+
+
+# Global broadcaster instance
+broadcaster = Broadcaster()
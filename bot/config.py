@@ -11,6 +11,7 @@ class Config:
     
     # Bot settings
     BOT_TOKEN = os.getenv("BOT_TOKEN")
+    ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()]
     
     # PostgreSQL settings
     POSTGRES_USER = os.getenv("POSTGRES_USER", "postgres")
@@ -19,6 +20,32 @@ class Config:
     POSTGRES_HOST = os.getenv("POSTGRES_HOST", "db")
     POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
     
+    # Personal stats (/me) cache size, users
+    PERSONAL_STATS_CACHE_SIZE = int(os.getenv("PERSONAL_STATS_CACHE_SIZE", "10000"))
+    
+    # Broadcast settings
+    BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "10"))
+    BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))  # messages per second
+    BROADCAST_BATCH = int(os.getenv("BROADCAST_BATCH", "500"))
+    BROADCAST_FLUSH_INTERVAL = float(os.getenv("BROADCAST_FLUSH_INTERVAL", "2"))  # seconds
+    BROADCAST_FLUSH_SIZE = int(os.getenv("BROADCAST_FLUSH_SIZE", "50"))
+    
+    # Profiling settings
+    PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))  # slowest updates to keep
+    PROFILE_DUMP_DIR = os.getenv("PROFILE_DUMP_DIR", "/tmp/bot_profiles")
+    
+    # Archival settings
+    ARCHIVE_INACTIVE_DAYS = int(os.getenv("ARCHIVE_INACTIVE_DAYS", "90"))
+    ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "500"))
+    ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "21600"))  # seconds
+    ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "30"))  # seconds
+    ACTIVITY_FLUSH_BATCH = int(os.getenv("ACTIVITY_FLUSH_BATCH", "100"))
+    
+    # User name refresh settings
+    NAME_FLUSH_INTERVAL = float(os.getenv("NAME_FLUSH_INTERVAL", "5"))  # seconds
+    NAME_FLUSH_BATCH = int(os.getenv("NAME_FLUSH_BATCH", "100"))
+    NAME_CACHE_SIZE = int(os.getenv("NAME_CACHE_SIZE", "50000"))  # users
+    
     @property
     def database_url(self) -> str:
         """Get database URL for SQLAlchemy"""
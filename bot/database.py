@@ -1,18 +1,113 @@
 """Database connection and operations"""
 
+import asyncio
 import logging
-from typing import List, Optional, Tuple
-from datetime import datetime
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+from datetime import date, datetime
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy import select, update, and_
+from sqlalchemy import (
+    select, update, delete, and_, or_, func, exists, literal, tuple_, values, column,
+    BigInteger, String
+)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 
 from bot.config import config
-from bot.models import Base, User, Chat, ChatUser
+from bot.models import (
+    Base, User, Chat, ChatUser, BroadcastJob, BroadcastDelivery,
+    ChatActivity, ChatMemberDeparture, ChatArchive, ChatUserArchive, DrawRule
+)
+from bot.draw_rules import DrawRuleIndex
+from bot.profiling import is_profiling, record_phase
 
 logger = logging.getLogger(__name__)
 
 
+class TimedAsyncSession(AsyncSession):
+    """AsyncSession recording pool checkout, query and commit time of profiled updates"""
+    
+    async def execute(self, *args, **kwargs):
+        if not is_profiling():
+            return await super().execute(*args, **kwargs)
+        
+        started = time.perf_counter()
+        await self.connection()
+        connected = time.perf_counter()
+        try:
+            return await super().execute(*args, **kwargs)
+        finally:
+            record_phase("db_connect", connected - started)
+            record_phase("db_query", time.perf_counter() - connected)
+    
+    async def commit(self):
+        if not is_profiling():
+            return await super().commit()
+        
+        started = time.perf_counter()
+        try:
+            return await super().commit()
+        finally:
+            record_phase("db_commit", time.perf_counter() - started)
+
+
+class UnitOfWork:
+    """
+    One session shared by the Database calls of an update
+    The session is opened on first use and committed once by commit(),
+    which also releases its connection back to the pool.
+    """
+    
+    def __init__(self, session_factory: async_sessionmaker):
+        self._session_factory = session_factory
+        self._session: Optional[AsyncSession] = None
+        self._after_commit: List[Callable[[], None]] = []
+    
+    def session(self) -> AsyncSession:
+        """Get shared session, opening it if needed"""
+        if self._session is None:
+            self._session = self._session_factory()
+        return self._session
+    
+    def after_commit(self, callback: Callable[[], None]):
+        """Run callback once changes are committed"""
+        self._after_commit.append(callback)
+    
+    async def commit(self):
+        """Commit changes and release session"""
+        if self._session is None:
+            return
+        
+        try:
+            await self._session.commit()
+        except Exception:
+            await self.rollback()
+            raise
+        callbacks, self._after_commit = self._after_commit, []
+        await self.close()
+        for callback in callbacks:
+            callback()
+    
+    async def rollback(self):
+        """Discard changes and release session"""
+        self._after_commit = []
+        if self._session is None:
+            return
+        
+        try:
+            await self._session.rollback()
+        finally:
+            await self.close()
+    
+    async def close(self):
+        """Release session, next use opens a new one"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
 class Database:
     """Database handler"""
     
@@ -24,82 +119,130 @@ class Database:
         )
         self.async_session = async_sessionmaker(
             self.engine,
-            class_=AsyncSession,
+            class_=TimedAsyncSession,
             expire_on_commit=False,
         )
+        # LRU cache for get_personal_stats: user_id -> rows, chat_id -> cached user_ids
+        self._personal_stats: "OrderedDict[int, List[Tuple]]" = OrderedDict()
+        self._personal_stats_by_chat: Dict[int, Set[int]] = {}
+        self._personal_stats_version = 0
+        # IDs of chats moved to chats_archive, archival and restore hold the lock
+        self._archived_chats: Set[int] = set()
+        self._archive_lock = asyncio.Lock()
+        # Draw rules index, loaded on first use; version is bumped by invalidation
+        self._draw_rules: Optional[DrawRuleIndex] = None
+        self._draw_rules_version = 0
     
     async def init_db(self):
         """Initialize database - create all tables"""
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            # create_all skips indexes of already existing tables
+            for index in ChatUser.__table__.indexes:
+                await conn.run_sync(index.create, checkfirst=True)
+            result = await conn.execute(select(ChatArchive.chat_id))
+            self._archived_chats = set(result.scalars().all())
         logger.info("Database initialized successfully")
     
+    def unit_of_work(self) -> UnitOfWork:
+        """Create unit of work for one update"""
+        return UnitOfWork(self.async_session)
+    
+    @asynccontextmanager
+    async def _session(self, uow: Optional[UnitOfWork]) -> AsyncIterator[AsyncSession]:
+        """Use update's shared session if given, otherwise a new one"""
+        if uow is not None:
+            yield uow.session()
+        else:
+            async with self.async_session() as session:
+                yield session
+    
+    async def _commit(
+        self,
+        session: AsyncSession,
+        uow: Optional[UnitOfWork],
+        on_commit: Optional[Callable[[], None]] = None
+    ):
+        """Commit own session; shared session is only flushed and committed by its unit of work"""
+        if uow is None:
+            await session.commit()
+            if on_commit:
+                on_commit()
+        else:
+            await session.flush()
+            if on_commit:
+                uow.after_commit(on_commit)
+    
+    async def _rollback(self, session: AsyncSession, uow: Optional[UnitOfWork]):
+        """Roll back own session or the whole unit of work"""
+        if uow is None:
+            await session.rollback()
+        else:
+            await uow.rollback()
+    
     async def registration(
         self,
         chat_id: int,
         user_id: int,
         username: Optional[str],
-        firstname: Optional[str]
+        firstname: Optional[str],
+        uow: Optional[UnitOfWork] = None
     ) -> Tuple[bool, str]:
         """
         Register user in chat
         Returns: (success: bool, message: str)
         """
-        async with self.async_session() as session:
+        async with self._session(uow) as session:
             try:
-                # Check if user already registered in this chat
-                stmt = select(ChatUser).where(
-                    and_(
-                        ChatUser.chat_id == chat_id,
-                        ChatUser.user_id == user_id
-                    )
-                )
-                result = await session.execute(stmt)
-                existing = result.scalar_one_or_none()
-                
-                if existing:
-                    return False, "Ты уже в игре"
-                
-                # Add or update user
-                stmt = select(User).where(User.user_id == user_id)
-                result = await session.execute(stmt)
-                user = result.scalar_one_or_none()
-                
-                if not user:
-                    user = User(user_id=user_id, username=username, firstname=firstname)
-                    session.add(user)
-                else:
-                    # Update user info
-                    user.username = username
-                    user.firstname = firstname
-                
-                # Add or get chat
-                stmt = select(Chat).where(Chat.chat_id == chat_id)
-                result = await session.execute(stmt)
-                chat = result.scalar_one_or_none()
+                # Bring back counters if user left the chat and was archived
+                restored = await self._restore_membership(session, chat_id, user_id)
                 
-                if not chat:
-                    chat = Chat(chat_id=chat_id)
-                    session.add(chat)
+                # Add or update user and add chat; upserts, so concurrent
+                # registrations in a new chat do not collide
+                stmt = insert(User).values(user_id=user_id, username=username, firstname=firstname)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[User.user_id],
+                    set_={
+                        "username": stmt.excluded.username,
+                        "firstname": stmt.excluded.firstname,
+                    }
+                )
+                await session.execute(stmt)
+                await session.execute(insert(Chat).values(chat_id=chat_id).on_conflict_do_nothing())
                 
-                # Add chat-user relationship
-                chat_user = ChatUser(chat_id=chat_id, user_id=user_id)
-                session.add(chat_user)
+                # Add chat-user relationship, nothing is returned if user already plays
+                result = await session.execute(
+                    insert(ChatUser)
+                    .values(chat_id=chat_id, user_id=user_id)
+                    .on_conflict_do_nothing()
+                    .returning(ChatUser.id)
+                )
+                registered = result.first() is not None
                 
-                await session.commit()
+                await self._commit(
+                    session, uow,
+                    (lambda: self.invalidate_personal_stats(chat_id, user_id))
+                    if registered or restored else None
+                )
+                if not registered:
+                    return False, "Ты уже в игре"
                 return True, f"{firstname or username}, Ты в игре"
                 
             except Exception as e:
-                await session.rollback()
+                await self._rollback(session, uow)
                 logger.error(f"Registration error: {e}")
                 return False, "Ошибка регистрации"
     
-    async def get_players(self, chat_id: int) -> List[Tuple[User, int, int]]:
+    async def get_players(
+        self,
+        chat_id: int,
+        uow: Optional[UnitOfWork] = None
+    ) -> List[Tuple[User, int, int]]:
         """
         Get list of players in chat
         Returns: List of (User, user_day_counter, pidor_counter)
         """
-        async with self.async_session() as session:
+        async with self._session(uow) as session:
             stmt = (
                 select(User, ChatUser.user_day_counter, ChatUser.pidor_counter)
                 .join(ChatUser, User.user_id == ChatUser.user_id)
@@ -109,9 +252,15 @@ class Database:
             result = await session.execute(stmt)
             return result.all()
     
-    async def is_same_day_running(self, chat_id: int, day: int, game_type: str) -> bool:
+    async def is_same_day_running(
+        self,
+        chat_id: int,
+        day: int,
+        game_type: str,
+        uow: Optional[UnitOfWork] = None
+    ) -> bool:
         """Check if game was already run today"""
-        async with self.async_session() as session:
+        async with self._session(uow) as session:
             stmt = select(Chat).where(Chat.chat_id == chat_id)
             result = await session.execute(stmt)
             chat = result.scalar_one_or_none()
@@ -126,9 +275,14 @@ class Database:
             
             return False
     
-    async def get_winner(self, chat_id: int, game_type: str) -> Optional[str]:
+    async def get_winner(
+        self,
+        chat_id: int,
+        game_type: str,
+        uow: Optional[UnitOfWork] = None
+    ) -> Optional[str]:
         """Get today's winner"""
-        async with self.async_session() as session:
+        async with self._session(uow) as session:
             stmt = select(Chat).where(Chat.chat_id == chat_id)
             result = await session.execute(stmt)
             chat = result.scalar_one_or_none()
@@ -149,10 +303,11 @@ class Database:
         user_id: int,
         winner_name: str,
         day: int,
-        game_type: str
+        game_type: str,
+        uow: Optional[UnitOfWork] = None
     ):
         """Set winner and update counters"""
-        async with self.async_session() as session:
+        async with self._session(uow) as session:
             try:
                 # Update chat with winner and day
                 if game_type == "user_of_the_day":
@@ -193,11 +348,552 @@ class Database:
                 )
                 await session.execute(stmt)
                 
-                await session.commit()
+                await self._commit(session, uow, lambda: self.invalidate_personal_stats(chat_id))
                 
             except Exception as e:
-                await session.rollback()
+                await self._rollback(session, uow)
                 logger.error(f"Error setting winner: {e}")
+    
+    async def get_personal_stats(self, user_id: int) -> List[Tuple]:
+        """
+        Get user's counters and ranks in every chat
+        Returns: List of (chat_id, chat_title, user_day_counter, user_day_rank,
+                          pidor_counter, pidor_rank, players_count)
+        """
+        cached = self._personal_stats.get(user_id)
+        if cached is not None:
+            self._personal_stats.move_to_end(user_id)
+            return cached
+        
+        version = self._personal_stats_version
+        async with self.async_session() as session:
+            user_chats = (
+                select(ChatUser.chat_id)
+                .where(ChatUser.user_id == user_id)
+            )
+            ranked = (
+                select(
+                    ChatUser.chat_id,
+                    ChatUser.user_id,
+                    ChatUser.user_day_counter,
+                    func.rank().over(
+                        partition_by=ChatUser.chat_id,
+                        order_by=ChatUser.user_day_counter.desc()
+                    ).label("user_day_rank"),
+                    ChatUser.pidor_counter,
+                    func.rank().over(
+                        partition_by=ChatUser.chat_id,
+                        order_by=ChatUser.pidor_counter.desc()
+                    ).label("pidor_rank"),
+                    func.count().over(partition_by=ChatUser.chat_id).label("players_count"),
+                )
+                .where(ChatUser.chat_id.in_(user_chats))
+                .subquery()
+            )
+            stmt = (
+                select(
+                    ranked.c.chat_id,
+                    ChatActivity.title,
+                    ranked.c.user_day_counter,
+                    ranked.c.user_day_rank,
+                    ranked.c.pidor_counter,
+                    ranked.c.pidor_rank,
+                    ranked.c.players_count,
+                )
+                .outerjoin(ChatActivity, ChatActivity.chat_id == ranked.c.chat_id)
+                .where(ranked.c.user_id == user_id)
+                .order_by(ranked.c.chat_id)
+            )
+            result = await session.execute(stmt)
+            rows = [tuple(row) for row in result.all()]
+        
+        # Rows read before a commit that invalidated stats meanwhile are stale
+        if version != self._personal_stats_version:
+            return rows
+        
+        self._personal_stats[user_id] = rows
+        for row in rows:
+            self._personal_stats_by_chat.setdefault(row[0], set()).add(user_id)
+        if len(self._personal_stats) > config.PERSONAL_STATS_CACHE_SIZE:
+            evicted_user_id, evicted_rows = self._personal_stats.popitem(last=False)
+            for row in evicted_rows:
+                self._personal_stats_by_chat.get(row[0], set()).discard(evicted_user_id)
+        return rows
+    
+    def invalidate_personal_stats(self, chat_id: int, user_id: Optional[int] = None):
+        """Drop cached personal stats of everyone playing in chat (and of user)"""
+        self._personal_stats_version += 1
+        for cached_user_id in self._personal_stats_by_chat.pop(chat_id, ()):
+            self._personal_stats.pop(cached_user_id, None)
+        if user_id is not None:
+            self._personal_stats.pop(user_id, None)
+    
+    async def update_user_names(
+        self,
+        names: Dict[int, Tuple[Optional[str], Optional[str]]]
+    ):
+        """
+        Update registered users' display names in one statement
+        names: {user_id: (username, firstname)}
+        Unknown users are skipped, rows whose names did not change are left untouched.
+        """
+        if not names:
+            return
+        
+        async with self.async_session() as session:
+            new_names = values(
+                column("user_id", BigInteger),
+                column("username", String),
+                column("firstname", String),
+                name="new_names"
+            ).data([
+                (user_id, username, firstname)
+                for user_id, (username, firstname) in names.items()
+            ])
+            stmt = (
+                update(User)
+                .where(
+                    User.user_id == new_names.c.user_id,
+                    or_(
+                        User.username.is_distinct_from(new_names.c.username),
+                        User.firstname.is_distinct_from(new_names.c.firstname),
+                    )
+                )
+                .values(username=new_names.c.username, firstname=new_names.c.firstname)
+            )
+            await session.execute(stmt)
+            await session.commit()
+    
+    async def create_broadcast(self, text: str, author_id: int) -> int:
+        """Create broadcast job, returns job id"""
+        async with self.async_session() as session:
+            job = BroadcastJob(text=text, author_id=author_id, status="running")
+            session.add(job)
+            await session.commit()
+            return job.id
+    
+    async def get_running_broadcasts(self) -> List[BroadcastJob]:
+        """Get broadcast jobs that were not finished"""
+        async with self.async_session() as session:
+            stmt = (
+                select(BroadcastJob)
+                .where(BroadcastJob.status == "running")
+                .order_by(BroadcastJob.id)
+            )
+            result = await session.execute(stmt)
+            return result.scalars().all()
+    
+    async def get_broadcast_chats(self, job_id: int, after_chat_id: Optional[int], limit: int) -> List[int]:
+        """
+        Get next batch of chat IDs not yet handled by job (keyset pagination by chat_id)
+        """
+        async with self.async_session() as session:
+            delivered = exists().where(
+                and_(
+                    BroadcastDelivery.job_id == job_id,
+                    BroadcastDelivery.chat_id == Chat.chat_id
+                )
+            )
+            stmt = select(Chat.chat_id).where(~delivered)
+            if after_chat_id is not None:
+                stmt = stmt.where(Chat.chat_id > after_chat_id)
+            stmt = stmt.order_by(Chat.chat_id).limit(limit)
+            result = await session.execute(stmt)
+            return result.scalars().all()
+    
+    async def save_broadcast_deliveries(
+        self,
+        job_id: int,
+        deliveries: List[Tuple[int, str, Optional[str]]]
+    ):
+        """
+        Record per-chat delivery results
+        deliveries: List of (chat_id, status, error)
+        """
+        if not deliveries:
+            return
+        
+        async with self.async_session() as session:
+            stmt = insert(BroadcastDelivery).values([
+                {"job_id": job_id, "chat_id": chat_id, "status": status, "error": error}
+                for chat_id, status, error in deliveries
+            ]).on_conflict_do_nothing()
+            await session.execute(stmt)
+            await session.commit()
+    
+    async def finish_broadcast(self, job_id: int) -> Dict[str, int]:
+        """Mark broadcast job as done, returns {status: count}"""
+        async with self.async_session() as session:
+            await session.execute(
+                update(BroadcastJob)
+                .where(BroadcastJob.id == job_id)
+                .values(status="done", finished_at=datetime.now())
+            )
+            stmt = (
+                select(BroadcastDelivery.status, func.count())
+                .where(BroadcastDelivery.job_id == job_id)
+                .group_by(BroadcastDelivery.status)
+            )
+            result = await session.execute(stmt)
+            counts = dict(result.all())
+            await session.commit()
+            return counts
+
+    
+    def is_chat_archived(self, chat_id: int) -> bool:
+        """Check if chat was moved to archive"""
+        return chat_id in self._archived_chats
+    
+    async def touch_chats(self, last_active: Dict[int, Tuple[datetime, Optional[str]]]):
+        """
+        Record chats' last activity and title, clearing bot removal mark
+        last_active: {chat_id: (last_active_at, title)}
+        """
+        if not last_active:
+            return
+        
+        async with self.async_session() as session:
+            stmt = insert(ChatActivity).values([
+                {"chat_id": chat_id, "last_active_at": active_at, "title": title, "removed_at": None}
+                for chat_id, (active_at, title) in last_active.items()
+            ])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ChatActivity.chat_id],
+                set_={
+                    "last_active_at": stmt.excluded.last_active_at,
+                    "title": func.coalesce(stmt.excluded.title, ChatActivity.title),
+                    "removed_at": None,
+                }
+            )
+            await session.execute(stmt)
+            await session.commit()
+    
+    async def set_chat_removed(self, chat_id: int):
+        """Mark chat as one the bot was removed from"""
+        async with self.async_session() as session:
+            stmt = insert(ChatActivity).values(chat_id=chat_id, removed_at=datetime.now())
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ChatActivity.chat_id],
+                set_={"removed_at": stmt.excluded.removed_at}
+            )
+            await session.execute(stmt)
+            await session.commit()
+    
+    async def add_member_departure(self, chat_id: int, user_id: int):
+        """Record member leaving chat, archived later by maintenance job"""
+        async with self.async_session() as session:
+            stmt = insert(ChatMemberDeparture).values(
+                chat_id=chat_id, user_id=user_id, left_at=datetime.now()
+            ).on_conflict_do_nothing()
+            await session.execute(stmt)
+            await session.commit()
+    
+    async def restore_membership(self, chat_id: int, user_id: int):
+        """Cancel member departure and bring back archived membership"""
+        async with self.async_session() as session:
+            restored = await self._restore_membership(session, chat_id, user_id)
+            await session.commit()
+        if restored:
+            self.invalidate_personal_stats(chat_id, user_id)
+    
+    async def _restore_membership(self, session: AsyncSession, chat_id: int, user_id: int) -> bool:
+        """
+        Move user's archived membership back into chat_user (no commit)
+        Returns True if it was restored; caller invalidates stats after commit.
+        """
+        await session.execute(
+            delete(ChatMemberDeparture).where(
+                and_(
+                    ChatMemberDeparture.chat_id == chat_id,
+                    ChatMemberDeparture.user_id == user_id
+                )
+            )
+        )
+        archived = and_(
+            ChatUserArchive.chat_id == chat_id,
+            ChatUserArchive.user_id == user_id,
+            ChatUserArchive.reason == "left"
+        )
+        result = await session.execute(
+            insert(ChatUser).from_select(
+                ["chat_id", "user_id", "user_day_counter", "pidor_counter"],
+                select(
+                    ChatUserArchive.chat_id,
+                    ChatUserArchive.user_id,
+                    ChatUserArchive.user_day_counter,
+                    ChatUserArchive.pidor_counter,
+                ).where(archived)
+            ).on_conflict_do_nothing()
+        )
+        if not result.rowcount:
+            return False
+        await session.execute(delete(ChatUserArchive).where(archived))
+        return True
+    
+    async def archive_inactive_chats(self, inactive_since: datetime, limit: int) -> int:
+        """
+        Move up to `limit` chats the bot was removed from or not used since
+        `inactive_since` (with their members) to archive tables
+        Returns number of archived chats.
+        """
+        async with self._archive_lock:
+            return await self._archive_inactive_chats(inactive_since, limit)
+    
+    async def _archive_inactive_chats(self, inactive_since: datetime, limit: int) -> int:
+        """Archive one batch of inactive chats, called under _archive_lock"""
+        async with self.async_session() as session:
+            now = datetime.now()
+            # Chats without activity record start their inactivity clock now
+            await session.execute(
+                insert(ChatActivity).from_select(
+                    ["chat_id", "last_active_at"],
+                    select(Chat.chat_id, literal(now))
+                ).on_conflict_do_nothing()
+            )
+            stmt = (
+                select(Chat.chat_id)
+                .join(ChatActivity, ChatActivity.chat_id == Chat.chat_id)
+                .where(
+                    or_(
+                        ChatActivity.removed_at.is_not(None),
+                        ChatActivity.last_active_at < inactive_since
+                    )
+                )
+                .order_by(Chat.chat_id)
+                .limit(limit)
+            )
+            result = await session.execute(stmt)
+            chat_ids = result.scalars().all()
+            if not chat_ids:
+                await session.commit()
+                return 0
+            
+            # Mark first: commands arriving from now on wait in restore_chat
+            # until this batch is committed and then restore it
+            self._archived_chats.update(chat_ids)
+            try:
+                await session.execute(
+                    insert(ChatUserArchive).from_select(
+                        ["chat_id", "user_id", "user_day_counter", "pidor_counter", "reason", "archived_at"],
+                        select(
+                            ChatUser.chat_id,
+                            ChatUser.user_id,
+                            ChatUser.user_day_counter,
+                            ChatUser.pidor_counter,
+                            literal("chat"),
+                            literal(now),
+                        ).where(ChatUser.chat_id.in_(chat_ids))
+                    ).on_conflict_do_nothing()
+                )
+                await session.execute(delete(ChatUser).where(ChatUser.chat_id.in_(chat_ids)))
+                await session.execute(
+                    insert(ChatArchive).from_select(
+                        [
+                            "chat_id", "user_of_the_day", "pidor_of_the_day",
+                            "user_of_the_day_run_day", "pidor_of_the_day_run_day", "archived_at"
+                        ],
+                        select(
+                            Chat.chat_id,
+                            Chat.user_of_the_day,
+                            Chat.pidor_of_the_day,
+                            Chat.user_of_the_day_run_day,
+                            Chat.pidor_of_the_day_run_day,
+                            literal(now),
+                        ).where(Chat.chat_id.in_(chat_ids))
+                    ).on_conflict_do_nothing()
+                )
+                await session.execute(delete(Chat).where(Chat.chat_id.in_(chat_ids)))
+                await session.execute(
+                    delete(ChatMemberDeparture).where(ChatMemberDeparture.chat_id.in_(chat_ids))
+                )
+                await session.commit()
+            except BaseException:
+                self._archived_chats.difference_update(chat_ids)
+                raise
+        
+        for chat_id in chat_ids:
+            self.invalidate_personal_stats(chat_id)
+        return len(chat_ids)
+    
+    async def archive_departed_members(self, limit: int) -> int:
+        """
+        Move up to `limit` memberships of users who left their chats to archive
+        Returns number of handled departures.
+        """
+        async with self.async_session() as session:
+            stmt = (
+                select(ChatMemberDeparture.chat_id, ChatMemberDeparture.user_id)
+                .order_by(ChatMemberDeparture.left_at)
+                .limit(limit)
+            )
+            result = await session.execute(stmt)
+            pairs = [tuple(row) for row in result.all()]
+            if not pairs:
+                return 0
+            
+            departed = tuple_(ChatUser.chat_id, ChatUser.user_id).in_(pairs)
+            await session.execute(
+                insert(ChatUserArchive).from_select(
+                    ["chat_id", "user_id", "user_day_counter", "pidor_counter", "reason", "archived_at"],
+                    select(
+                        ChatUser.chat_id,
+                        ChatUser.user_id,
+                        ChatUser.user_day_counter,
+                        ChatUser.pidor_counter,
+                        literal("left"),
+                        literal(datetime.now()),
+                    ).where(departed)
+                ).on_conflict_do_nothing()
+            )
+            await session.execute(delete(ChatUser).where(departed))
+            await session.execute(
+                delete(ChatMemberDeparture).where(
+                    tuple_(ChatMemberDeparture.chat_id, ChatMemberDeparture.user_id).in_(pairs)
+                )
+            )
+            await session.commit()
+        
+        for chat_id, user_id in pairs:
+            self.invalidate_personal_stats(chat_id, user_id)
+        return len(pairs)
+    
+    async def restore_chat(self, chat_id: int):
+        """Move archived chat and its members back to hot tables"""
+        async with self._archive_lock:
+            if chat_id not in self._archived_chats:
+                # Restored by a concurrent call or archival was rolled back
+                return
+            await self._restore_chat(chat_id)
+        
+        self.invalidate_personal_stats(chat_id)
+        logger.info(f"Chat {chat_id} restored from archive")
+    
+    async def _restore_chat(self, chat_id: int):
+        """Restore chat, called under _archive_lock"""
+        async with self.async_session() as session:
+            await session.execute(
+                insert(Chat).from_select(
+                    [
+                        "chat_id", "user_of_the_day", "pidor_of_the_day",
+                        "user_of_the_day_run_day", "pidor_of_the_day_run_day"
+                    ],
+                    select(
+                        ChatArchive.chat_id,
+                        ChatArchive.user_of_the_day,
+                        ChatArchive.pidor_of_the_day,
+                        ChatArchive.user_of_the_day_run_day,
+                        ChatArchive.pidor_of_the_day_run_day,
+                    ).where(ChatArchive.chat_id == chat_id)
+                ).on_conflict_do_nothing()
+            )
+            archived_members = and_(
+                ChatUserArchive.chat_id == chat_id,
+                ChatUserArchive.reason == "chat"
+            )
+            # A member registered again meanwhile keeps both counters
+            stmt = insert(ChatUser).from_select(
+                ["chat_id", "user_id", "user_day_counter", "pidor_counter"],
+                select(
+                    ChatUserArchive.chat_id,
+                    ChatUserArchive.user_id,
+                    ChatUserArchive.user_day_counter,
+                    ChatUserArchive.pidor_counter,
+                ).where(archived_members)
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ChatUser.chat_id, ChatUser.user_id],
+                set_={
+                    "user_day_counter": ChatUser.user_day_counter + stmt.excluded.user_day_counter,
+                    "pidor_counter": ChatUser.pidor_counter + stmt.excluded.pidor_counter,
+                }
+            ).returning(ChatUser.user_id)
+            result = await session.execute(stmt)
+            restored_user_ids = result.scalars().all()
+            # Delete only rows that made it back
+            await session.execute(
+                delete(ChatUserArchive).where(
+                    and_(archived_members, ChatUserArchive.user_id.in_(restored_user_ids))
+                )
+            )
+            await session.execute(delete(ChatArchive).where(ChatArchive.chat_id == chat_id))
+            stmt = insert(ChatActivity).values(chat_id=chat_id, last_active_at=datetime.now())
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[ChatActivity.chat_id],
+                set_={"last_active_at": stmt.excluded.last_active_at, "removed_at": None}
+            )
+            await session.execute(stmt)
+            await session.commit()
+        self._archived_chats.discard(chat_id)
+
+    
+    async def get_draw_rules(self, uow: Optional[UnitOfWork] = None) -> DrawRuleIndex:
+        """
+        Get draw rules index, loading it from the database if needed
+        With a unit of work the load reuses its connection instead of
+        checking out a second one.
+        """
+        rules = self._draw_rules
+        if rules is None:
+            version = self._draw_rules_version
+            async with self._session(uow) as session:
+                # Index keeps this order, choose_winner relies on it
+                result = await session.execute(select(DrawRule).order_by(DrawRule.id))
+                loaded = result.scalars().all()
+                # Cached rules must outlive the session and survive its rollback
+                for rule in loaded:
+                    session.expunge(rule)
+                rules = DrawRuleIndex(loaded)
+            # Keep index only if rules did not change while loading
+            if version == self._draw_rules_version:
+                self._draw_rules = rules
+        return rules
+    
+    def invalidate_draw_rules(self):
+        """Drop draw rules index, it is reloaded on next draw"""
+        self._draw_rules_version += 1
+        self._draw_rules = None
+    
+    async def list_draw_rules(self) -> List[DrawRule]:
+        """Get all draw rules"""
+        async with self.async_session() as session:
+            result = await session.execute(select(DrawRule).order_by(DrawRule.id))
+            return result.scalars().all()
+    
+    async def add_draw_rule(
+        self,
+        chat_id: int,
+        game_type: str,
+        start_date: date,
+        end_date: date,
+        user_id: int,
+        weight: Optional[float] = None
+    ) -> Optional[int]:
+        """Add draw rule, returns rule id or None if user is unknown"""
+        async with self.async_session() as session:
+            rule = DrawRule(
+                chat_id=chat_id,
+                game_type=game_type,
+                start_date=start_date,
+                end_date=end_date,
+                user_id=user_id,
+                weight=weight
+            )
+            session.add(rule)
+            try:
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                return None
+        self.invalidate_draw_rules()
+        return rule.id
+    
+    async def delete_draw_rule(self, rule_id: int) -> bool:
+        """Delete draw rule, returns False if it did not exist"""
+        async with self.async_session() as session:
+            result = await session.execute(delete(DrawRule).where(DrawRule.id == rule_id))
+            await session.commit()
+        self.invalidate_draw_rules()
+        return result.rowcount > 0
 
 
 # Global database instance
@@ -0,0 +1,88 @@
+"""Draw override rules: interval index and winner selection"""
+
+import bisect
+import math
+import random
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from bot.models import DrawRule, User
+
+
+class DrawRuleIndex:
+    """
+    In-memory index of draw rules per (chat_id, game_type)
+    Rule date ranges are cut into non-overlapping segments, each holding
+    the rules active on it, so a lookup is one bisect over segment starts.
+    Rules keep their input order within a segment.
+    """
+
+    def __init__(self, rules: Iterable[DrawRule]):
+        grouped: Dict[Tuple[int, str], List[DrawRule]] = {}
+        for rule in rules:
+            grouped.setdefault((rule.chat_id, rule.game_type), []).append(rule)
+
+        self._segments: Dict[Tuple[int, str], Tuple[List[int], List[List[DrawRule]]]] = {
+            key: self._build(group) for key, group in grouped.items()
+        }
+
+    @staticmethod
+    def _build(rules: List[DrawRule]) -> Tuple[List[int], List[List[DrawRule]]]:
+        """Build (segment starts, rules active in segment) from rules"""
+        # Boundaries as ordinals; end dates are inclusive
+        bounds = sorted(
+            {rule.start_date.toordinal() for rule in rules}
+            | {rule.end_date.toordinal() + 1 for rule in rules}
+        )
+        starts, active = [], []
+        for start in bounds:
+            segment = [
+                rule for rule in rules
+                if rule.start_date.toordinal() <= start <= rule.end_date.toordinal()
+            ]
+            starts.append(start)
+            active.append(segment)
+        return starts, active
+
+    def lookup(self, chat_id: int, game_type: str, day: date) -> List[DrawRule]:
+        """Get rules active in chat for game on day"""
+        segments = self._segments.get((chat_id, game_type))
+        if segments is None:
+            return []
+
+        starts, active = segments
+        i = bisect.bisect_right(starts, day.toordinal()) - 1
+        return active[i] if i >= 0 else []
+
+
+def is_valid_weight(weight: Optional[float]) -> bool:
+    """Check if rule weight is usable: None (forced winner) or finite and > 0"""
+    return weight is None or (math.isfinite(weight) and weight > 0)
+
+
+def choose_winner(players: Sequence[Tuple[User, int, int]], rules: List[DrawRule]) -> User:
+    """
+    Pick winner among players (User, user_day_counter, pidor_counter)
+    A registered forced winner wins; otherwise weights of rules apply
+    (players without rule weigh 1). Invalid weights are ignored.
+    Rules come in id order: of overlapping forced winners the oldest rule
+    wins, of several weights for one user the newest applies.
+    """
+    if rules:
+        users = {row[0].user_id: row[0] for row in players}
+        for rule in rules:
+            if rule.weight is None and rule.user_id in users:
+                return users[rule.user_id]
+
+        weights = {
+            rule.user_id: rule.weight
+            for rule in rules
+            if rule.weight is not None and is_valid_weight(rule.weight)
+        }
+        if weights:
+            return random.choices(
+                [row[0] for row in players],
+                weights=[weights.get(row[0].user_id, 1.0) for row in players]
+            )[0]
+
+    return random.choice(players)[0]
@@ -1,22 +1,34 @@
 """Bot command handlers"""
 
 import asyncio
-import random
+import html
 import logging
 from datetime import datetime, date
 from typing import Optional
 
 from aiogram import Router, F
-from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.filters import (
+    Command,
+    CommandObject,
+    ChatMemberUpdatedFilter,
+    JOIN_TRANSITION,
+    LEAVE_TRANSITION
+)
+from aiogram.types import ChatMemberUpdated, Message
 
-from bot.database import db
+from bot.broadcast import broadcaster
+from bot.config import config
+from bot.database import db, UnitOfWork
+from bot.draw_rules import choose_winner, is_valid_weight
+from bot.profiling import profiler, unprofiled
 from bot.messages import (
     MESSAGES_USER_OF_THE_DAY,
     MESSAGES_PIDOR_OF_THE_DAY,
     NO_PLAYERS,
     STAT_USER_HEADER,
-    STAT_PIDOR_HEADER
+    STAT_PIDOR_HEADER,
+    STAT_ME_HEADER,
+    NOT_IN_GAME
 )
 
 logger = logging.getLogger(__name__)
@@ -27,10 +39,7 @@ MESSAGE_DELAY = 1.5  # seconds
 # Хардкод: Разрешенные чаты
 ALLOWED_CHATS = [-1645180577, -5050482476]
 
-# Хардкод: Специальный период для RussianBeerHunter
-SPECIAL_PIDOR_USERNAME = "RussianBeerHunter"
-SPECIAL_PIDOR_START = date(2026, 2, 18)  # 18.02.2026
-SPECIAL_PIDOR_END = date(2026, 2, 25)    # 25.02.2026
+GAME_TYPES = ("user_of_the_day", "pidor_of_the_day")
 
 
 def get_today() -> int:
@@ -43,7 +52,8 @@ async def send_messages_with_delay(message: Message, messages: list, winner_name
     # Send all messages except the first one (which contains winner)
     for msg in messages[1:]:
         await message.answer(msg)
-        await asyncio.sleep(MESSAGE_DELAY)
+        with unprofiled("delay"):
+            await asyncio.sleep(MESSAGE_DELAY)
     
     # Send final message with winner
     await message.answer(messages[0] + winner_name)
@@ -54,14 +64,13 @@ def is_chat_allowed(chat_id: int) -> bool:
     return chat_id in ALLOWED_CHATS
 
 
-def is_special_pidor_period() -> bool:
-    """Check if current date is in special period for RussianBeerHunter"""
-    today = date.today()
-    return SPECIAL_PIDOR_START <= today <= SPECIAL_PIDOR_END
+def is_admin(user_id: int) -> bool:
+    """Check if user is bot admin"""
+    return user_id in config.ADMIN_IDS
 
 
 @router.message(Command("reg"))
-async def cmd_registration(message: Message):
+async def cmd_registration(message: Message, uow: UnitOfWork):
     """Handle /reg command - register user in game"""
     if message.chat.type == "private":
         await message.answer("Эта команда работает только в группах")
@@ -77,14 +86,16 @@ async def cmd_registration(message: Message):
         chat_id=message.chat.id,
         user_id=user.id,
         username=user.username,
-        firstname=user.first_name
+        firstname=user.first_name,
+        uow=uow
     )
+    await uow.commit()
     
     await message.answer(msg)
 
 
 @router.message(Command("run"))
-async def cmd_run_user_of_the_day(message: Message):
+async def cmd_run_user_of_the_day(message: Message, uow: UnitOfWork):
     """Handle /run command - run 'User of the Day' game"""
     if message.chat.type == "private":
         await message.answer("Эта команда работает только в группах")
@@ -95,11 +106,11 @@ async def cmd_run_user_of_the_day(message: Message):
         logger.info(f"Access denied for chat {message.chat.id}")
         return
     
-    await run_game(message, "user_of_the_day", MESSAGES_USER_OF_THE_DAY)
+    await run_game(message, "user_of_the_day", MESSAGES_USER_OF_THE_DAY, uow)
 
 
 @router.message(Command("pidor"))
-async def cmd_run_pidor_of_the_day(message: Message):
+async def cmd_run_pidor_of_the_day(message: Message, uow: UnitOfWork):
     """Handle /pidor command - run 'Pidor of the Day' game"""
     if message.chat.type == "private":
         await message.answer("Эта команда работает только в группах")
@@ -110,63 +121,48 @@ async def cmd_run_pidor_of_the_day(message: Message):
         logger.info(f"Access denied for chat {message.chat.id}")
         return
     
-    await run_game(message, "pidor_of_the_day", MESSAGES_PIDOR_OF_THE_DAY)
+    await run_game(message, "pidor_of_the_day", MESSAGES_PIDOR_OF_THE_DAY, uow)
 
 
-async def run_game(message: Message, game_type: str, messages: list):
+async def run_game(message: Message, game_type: str, messages: list, uow: UnitOfWork):
     """Run game logic"""
     chat_id = message.chat.id
     today = get_today()
     
     # Check if game was already run today
-    if await db.is_same_day_running(chat_id, today, game_type):
-        winner = await db.get_winner(chat_id, game_type)
+    if await db.is_same_day_running(chat_id, today, game_type, uow=uow):
+        winner = await db.get_winner(chat_id, game_type, uow=uow)
+        await uow.commit()
         await message.answer(messages[0] + (winner or "Неизвестно"))
         return
     
     # Get players
-    players = await db.get_players(chat_id)
+    players = await db.get_players(chat_id, uow=uow)
     
     if not players:
+        await uow.commit()
         await message.answer(NO_PLAYERS)
         return
     
-    # ХАРДКОД: Специальный период для RussianBeerHunter (18.02.2026 - 25.02.2026)
-    if game_type == "pidor_of_the_day" and is_special_pidor_period():
-        # Найти RussianBeerHunter среди игроков
-        special_user = None
-        for player_data in players:
-            user = player_data[0]
-            if user.username == SPECIAL_PIDOR_USERNAME:
-                special_user = user
-                break
-        
-        if special_user:
-            winner_user = special_user
-            winner_name = special_user.get_stats_name()  # Используем формат "firstname (@username)"
-            logger.info(f"Special period: {SPECIAL_PIDOR_USERNAME} is pidor of the day")
-        else:
-            # Если RussianBeerHunter не зарегистрирован, выбрать случайного
-            logger.warning(f"{SPECIAL_PIDOR_USERNAME} not found in players, selecting random")
-            winner_data = random.choice(players)
-            winner_user = winner_data[0]
-            winner_name = winner_user.get_stats_name() if game_type == "pidor_of_the_day" else winner_user.get_notification_name()
-    else:
-        # Select random winner
-        winner_data = random.choice(players)
-        winner_user = winner_data[0]
-        # Для обоих игр используем формат "firstname (@username)"
-        winner_name = winner_user.get_stats_name()
+    # Select winner, honouring draw rules active today
+    rules = await db.get_draw_rules(uow=uow)
+    active_rules = rules.lookup(chat_id, game_type, date.today())
+    winner_user = choose_winner(players, active_rules)
+    if active_rules:
+        logger.info(f"Draw rules {[rule.id for rule in active_rules]} applied in chat {chat_id}")
+    # Для обоих игр используем формат "firstname (@username)"
+    winner_name = winner_user.get_stats_name()
     
     # Save winner to database
-    await db.set_winner(chat_id, winner_user.user_id, winner_name, today, game_type)
+    await db.set_winner(chat_id, winner_user.user_id, winner_name, today, game_type, uow=uow)
+    await uow.commit()
     
     # Send messages with delay
     await send_messages_with_delay(message, messages, winner_name)
 
 
 @router.message(Command("stat_user"))
-async def cmd_stat_user(message: Message):
+async def cmd_stat_user(message: Message, uow: UnitOfWork):
     """Handle /stat_user command - show User of the Day statistics"""
     if message.chat.type == "private":
         await message.answer("Эта команда работает только в группах")
@@ -177,11 +173,11 @@ async def cmd_stat_user(message: Message):
         logger.info(f"Access denied for chat {message.chat.id}")
         return
     
-    await send_statistics(message, "user", STAT_USER_HEADER)
+    await send_statistics(message, "user", STAT_USER_HEADER, uow)
 
 
 @router.message(Command("stat_pidor"))
-async def cmd_stat_pidor(message: Message):
+async def cmd_stat_pidor(message: Message, uow: UnitOfWork):
     """Handle /stat_pidor command - show Pidor of the Day statistics"""
     if message.chat.type == "private":
         await message.answer("Эта команда работает только в группах")
@@ -192,11 +188,11 @@ async def cmd_stat_pidor(message: Message):
         logger.info(f"Access denied for chat {message.chat.id}")
         return
     
-    await send_statistics(message, "pidor", STAT_PIDOR_HEADER)
+    await send_statistics(message, "pidor", STAT_PIDOR_HEADER, uow)
 
 
 @router.message(Command("pidorstats"))
-async def cmd_pidorstats(message: Message):
+async def cmd_pidorstats(message: Message, uow: UnitOfWork):
     """Handle /pidorstats command - show Pidor of the Day statistics"""
     if message.chat.type == "private":
         await message.answer("Эта команда работает только в группах")
@@ -207,11 +203,11 @@ async def cmd_pidorstats(message: Message):
         logger.info(f"Access denied for chat {message.chat.id}")
         return
     
-    await send_statistics(message, "pidor", STAT_PIDOR_HEADER)
+    await send_statistics(message, "pidor", STAT_PIDOR_HEADER, uow)
 
 
 @router.message(Command("stats"))
-async def cmd_stats(message: Message):
+async def cmd_stats(message: Message, uow: UnitOfWork):
     """Handle /stats command - show User of the Day statistics"""
     if message.chat.type == "private":
         await message.answer("Эта команда работает только в группах")
@@ -222,13 +218,14 @@ async def cmd_stats(message: Message):
         logger.info(f"Access denied for chat {message.chat.id}")
         return
     
-    await send_statistics(message, "user", STAT_USER_HEADER)
+    await send_statistics(message, "user", STAT_USER_HEADER, uow)
 
 
-async def send_statistics(message: Message, stat_type: str, header: str):
+async def send_statistics(message: Message, stat_type: str, header: str, uow: UnitOfWork):
     """Send game statistics"""
     chat_id = message.chat.id
-    players = await db.get_players(chat_id)
+    players = await db.get_players(chat_id, uow=uow)
+    await uow.commit()
     
     if not players:
         await message.answer(NO_PLAYERS)
@@ -250,3 +247,172 @@ async def send_statistics(message: Message, stat_type: str, header: str):
         stats += f"{i}) {display_name} - {counter} раз(а)\n"
     
     await message.answer(stats)
+
+
+@router.message(Command("me"))
+async def cmd_me(message: Message):
+    """Handle /me command - show user's statistics across all chats"""
+    # В личке доступно всегда, в группах - только в разрешенных чатах
+    if message.chat.type != "private" and not is_chat_allowed(message.chat.id):
+        logger.info(f"Access denied for chat {message.chat.id}")
+        return
+    
+    rows = await db.get_personal_stats(message.from_user.id)
+    
+    if not rows:
+        await message.answer(NOT_IN_GAME)
+        return
+    
+    stats = STAT_ME_HEADER
+    for chat_id, title, user_counter, user_rank, pidor_counter, pidor_rank, players_count in rows:
+        chat_name = html.escape(title) if title else f"Чат {chat_id}"
+        marker = " (этот чат)" if chat_id == message.chat.id else ""
+        stats += (
+            f"\n{chat_name}{marker}:\n"
+            f"🎉 Красавчик - {user_counter} раз(а), место {user_rank} из {players_count}\n"
+            f"🌈 Пидор - {pidor_counter} раз(а), место {pidor_rank} из {players_count}\n"
+        )
+    
+    await message.answer(stats)
+
+
+@router.message(Command("broadcast"))
+async def cmd_broadcast(message: Message, command: CommandObject):
+    """Handle /broadcast <text> command - send text to all registered chats (admin only)"""
+    if message.chat.type != "private" or not is_admin(message.from_user.id):
+        return
+    
+    if not command.args:
+        await message.answer("Использование: /broadcast текст")
+        return
+    
+    job_id = await db.create_broadcast(command.args, message.from_user.id)
+    broadcaster.start(message.bot, job_id, command.args, message.from_user.id)
+    await message.answer(f"Рассылка #{job_id} запущена")
+
+
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    """
+    Handle /profile command - control update profiling (admin only)
+    /profile on [rate] | chat [chat_id] | off | dump
+    """
+    if not is_admin(message.from_user.id):
+        return
+    
+    args = (command.args or "").split()
+    action = args[0] if args else ""
+    
+    try:
+        if action == "on":
+            profiler.enable(sample_rate=float(args[1]) if len(args) > 1 else 1.0)
+        elif action == "chat":
+            profiler.enable(chat_id=int(args[1]) if len(args) > 1 else message.chat.id)
+        elif action == "off":
+            profiler.disable()
+        elif action == "dump":
+            paths = profiler.dump()
+            await message.answer("\n".join(paths) or "Нет данных")
+            return
+    except ValueError:
+        await message.answer("Использование: /profile on [rate] | chat [chat_id] | off | dump")
+        return
+    
+    status = (
+        f"Профилирование: {'вкл' if profiler.enabled else 'выкл'}, "
+        f"rate={profiler.sample_rate}, chat={profiler.chat_id}\n"
+    )
+    for record in profiler.slowest()[:5]:
+        status += record.describe() + "\n"
+    await message.answer(status)
+
+
+@router.my_chat_member(ChatMemberUpdatedFilter(LEAVE_TRANSITION))
+async def on_bot_removed(event: ChatMemberUpdated):
+    """Bot was removed from chat - mark it for archival"""
+    logger.info(f"Bot removed from chat {event.chat.id}")
+    await db.set_chat_removed(event.chat.id)
+
+
+@router.my_chat_member(ChatMemberUpdatedFilter(JOIN_TRANSITION))
+async def on_bot_added(event: ChatMemberUpdated):
+    """Bot was added to chat - bring it back from archive"""
+    logger.info(f"Bot added to chat {event.chat.id}")
+    if db.is_chat_archived(event.chat.id):
+        await db.restore_chat(event.chat.id)
+    await db.touch_chats({event.chat.id: (datetime.now(), event.chat.title)})
+
+
+@router.chat_member(ChatMemberUpdatedFilter(LEAVE_TRANSITION))
+async def on_member_left(event: ChatMemberUpdated):
+    """Member left chat - archive membership later"""
+    await db.add_member_departure(event.chat.id, event.new_chat_member.user.id)
+
+
+@router.chat_member(ChatMemberUpdatedFilter(JOIN_TRANSITION))
+async def on_member_joined(event: ChatMemberUpdated):
+    """Member (re)joined chat - restore archived membership"""
+    if not db.is_chat_archived(event.chat.id):
+        await db.restore_membership(event.chat.id, event.new_chat_member.user.id)
+
+
+@router.message(Command("draw_rule"))
+async def cmd_draw_rule(message: Message, command: CommandObject):
+    """
+    Handle /draw_rule command - manage draw rules (admin only)
+    /draw_rule add <chat_id> <game_type> <YYYY-MM-DD> <YYYY-MM-DD> <user_id> [weight]
+    /draw_rule del <rule_id> | list | reload
+    """
+    if not is_admin(message.from_user.id):
+        return
+    
+    args = (command.args or "").split()
+    action = args[0] if args else "list"
+    
+    try:
+        if action == "add" and len(args) in (6, 7) and args[2] in GAME_TYPES:
+            start_date = date.fromisoformat(args[3])
+            end_date = date.fromisoformat(args[4])
+            weight = float(args[6]) if len(args) == 7 else None
+            if start_date > end_date:
+                await message.answer("Дата начала позже даты окончания")
+                return
+            if not is_valid_weight(weight):
+                await message.answer("Вес должен быть конечным числом больше нуля")
+                return
+
+            rule_id = await db.add_draw_rule(
+                chat_id=int(args[1]),
+                game_type=args[2],
+                start_date=start_date,
+                end_date=end_date,
+                user_id=int(args[5]),
+                weight=weight
+            )
+            if rule_id is None:
+                await message.answer("Пользователь не найден")
+                return
+            await message.answer(f"Правило #{rule_id} добавлено")
+            return
+        if action == "del" and len(args) == 2:
+            deleted = await db.delete_draw_rule(int(args[1]))
+            await message.answer("Правило удалено" if deleted else "Правило не найдено")
+            return
+    except ValueError:
+        pass
+    
+    if action == "reload":
+        db.invalidate_draw_rules()
+        await message.answer("Правила будут перечитаны при следующем розыгрыше")
+    elif action == "list":
+        rules = await db.list_draw_rules()
+        await message.answer("\n".join(
+            f"#{rule.id} chat {rule.chat_id} {rule.game_type} {rule.start_date}..{rule.end_date} "
+            f"user {rule.user_id} {'победитель' if rule.weight is None else f'вес {rule.weight}'}"
+            for rule in rules
+        ) or "Правил нет")
+    else:
+        await message.answer(
+            "Использование: /draw_rule add <chat_id> <game_type> <с> <по> <user_id> [вес] "
+            "| del <id> | list | reload"
+        )
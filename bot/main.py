@@ -2,6 +2,7 @@
 
 import asyncio
 import logging
+import signal
 import sys
 
 from aiogram import Bot, Dispatcher
@@ -9,9 +10,13 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from sqlalchemy import select
 
+from bot.archive import ArchiveJob
+from bot.broadcast import broadcaster
 from bot.config import config
 from bot.database import db
 from bot.handlers import router
+from bot.middlewares import ChatActivityMiddleware, UnitOfWorkMiddleware, UserNameTrackerMiddleware
+from bot.profiling import profiler, TelegramTimingMiddleware
 from bot.models import User
 
 # Configure logging
@@ -61,14 +66,42 @@ async def main():
     )
     dp = Dispatcher()
     
+    # Profiling is off until enabled by /profile or SIGUSR1 (SIGUSR2 dumps)
+    dp.update.outer_middleware(profiler)
+    bot.session.middleware(TelegramTimingMiddleware())
+    if hasattr(signal, "SIGUSR1"):
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGUSR1, profiler.toggle)
+        loop.add_signal_handler(signal.SIGUSR2, profiler.dump)
+    
+    # Track display names of everyone who writes to the bot
+    name_tracker = UserNameTrackerMiddleware()
+    dp.update.outer_middleware(name_tracker)
+    
+    # Track chat activity on commands and restore archived chats
+    chat_activity = ChatActivityMiddleware()
+    router.message.middleware(chat_activity)
+    
+    # One lazily opened database session per update
+    router.message.middleware(UnitOfWorkMiddleware())
+    
     # Register router with handlers
     dp.include_router(router)
     
     # Start bot
     logger.info("Starting bot...")
+    name_tracker.start()
+    chat_activity.start()
+    archive_job = ArchiveJob()
+    archive_job.start()
+    await broadcaster.resume(bot)
     try:
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        await broadcaster.stop()
+        await archive_job.stop()
+        await chat_activity.stop()
+        await name_tracker.stop()
         await bot.session.close()
 
 
@@ -25,3 +25,5 @@ ALREADY_REGISTERED = "Ты уже в игре"
 REGISTRATION_SUCCESS = ", Ты в игре"
 STAT_USER_HEADER = "🎉 Результаты Красавчик Дня\n"
 STAT_PIDOR_HEADER = "Результаты 🌈ПИДОР Дня\n"
+STAT_ME_HEADER = "📊 Твоя статистика по чатам\n"
+NOT_IN_GAME = "Ты пока не участвуешь ни в одной игре. Напиши /reg в группе"
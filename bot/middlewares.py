@@ -0,0 +1,209 @@
+"""Dispatcher middlewares"""
+
+import asyncio
+import logging
+from abc import abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import Chat as TelegramChat, TelegramObject, User as TelegramUser
+
+from bot.config import config
+from bot.database import db
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindMiddleware(BaseMiddleware):
+    """
+    Base for middlewares buffering writes in a dirty map
+    The map is flushed to the database in one batch every flush_interval
+    seconds or once flush_batch changes pile up, and on stop().
+    """
+
+    def __init__(self, flush_interval: float, flush_batch: int):
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self._dirty: Dict[int, Any] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def mark(self, key: int, value: Any):
+        """Put change into dirty map"""
+        self._dirty[key] = value
+        if len(self._dirty) >= self.flush_batch:
+            self._wakeup.set()
+
+    @abstractmethod
+    async def write(self, batch: Dict[int, Any]):
+        """Write batch to the database"""
+
+    async def flush(self):
+        """Write all pending changes to the database"""
+        if not self._dirty:
+            return
+
+        batch, self._dirty = self._dirty, {}
+        try:
+            await self.write(batch)
+            logger.debug(f"{type(self).__name__}: flushed {len(batch)} change(s)")
+        except asyncio.CancelledError:
+            self._restore(batch)
+            raise
+        except Exception as e:
+            logger.error(f"{type(self).__name__}: error flushing changes: {e}")
+            self._restore(batch)
+
+    def _restore(self, batch: Dict[int, Any]):
+        """Keep unsaved changes for the next flush unless newer ones arrived meanwhile"""
+        for key, value in batch.items():
+            self._dirty.setdefault(key, value)
+
+    async def _run(self):
+        """Background flush loop"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        """Start background flushing"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop background flushing and write out remaining changes"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+class UserNameTrackerMiddleware(WriteBehindMiddleware):
+    """
+    Write-behind refresh of users' display names
+    Remembers the last seen (username, firstname) of up to cache_size
+    recent senders and marks only changed names as dirty. Only users
+    already registered somewhere are updated.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = config.NAME_FLUSH_INTERVAL,
+        flush_batch: int = config.NAME_FLUSH_BATCH,
+        cache_size: int = config.NAME_CACHE_SIZE
+    ):
+        super().__init__(flush_interval, flush_batch)
+        self.cache_size = cache_size
+        self._known: "OrderedDict[int, Tuple[Optional[str], Optional[str]]]" = OrderedDict()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        user: Optional[TelegramUser] = data.get("event_from_user")
+        if user is not None and not user.is_bot:
+            self.track(user.id, user.username, user.first_name)
+        return await handler(event, data)
+
+    def track(self, user_id: int, username: Optional[str], firstname: Optional[str]):
+        """Mark user's names as dirty if they differ from the last seen ones"""
+        names = (username, firstname)
+        if self._known.get(user_id) == names:
+            self._known.move_to_end(user_id)
+            return
+
+        self._known[user_id] = names
+        self._known.move_to_end(user_id)
+        if len(self._known) > self.cache_size:
+            self._known.popitem(last=False)
+        self.mark(user_id, names)
+
+    async def write(self, batch: Dict[int, Tuple[Optional[str], Optional[str]]]):
+        await db.update_user_names(batch)
+
+
+class ChatActivityMiddleware(WriteBehindMiddleware):
+    """
+    Tracks when chats last used a command and their titles, and restores
+    archived chats
+    Meant as inner middleware on messages, so it only sees updates that
+    matched a handler. Activity is written at most once per
+    ACTIVITY_RESOLUTION per chat, or sooner if the title changed.
+    """
+
+    ACTIVITY_RESOLUTION = timedelta(hours=1)
+
+    def __init__(
+        self,
+        flush_interval: float = config.ACTIVITY_FLUSH_INTERVAL,
+        flush_batch: int = config.ACTIVITY_FLUSH_BATCH
+    ):
+        super().__init__(flush_interval, flush_batch)
+        self._last_seen: Dict[int, Tuple[datetime, Optional[str]]] = {}
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        chat: Optional[TelegramChat] = data.get("event_chat")
+        if chat is not None and chat.type != "private":
+            if db.is_chat_archived(chat.id):
+                await db.restore_chat(chat.id)
+            self.touch(chat.id, chat.title)
+        return await handler(event, data)
+
+    def touch(self, chat_id: int, title: Optional[str]):
+        """Mark chat as active now"""
+        now = datetime.now()
+        last_seen = self._last_seen.get(chat_id)
+        if (
+            last_seen is not None
+            and now - last_seen[0] < self.ACTIVITY_RESOLUTION
+            and last_seen[1] == title
+        ):
+            return
+
+        self._last_seen[chat_id] = (now, title)
+        self.mark(chat_id, (now, title))
+
+    async def write(self, batch: Dict[int, Tuple[datetime, Optional[str]]]):
+        await db.touch_chats(batch)
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+    """
+    Gives handlers one database session per update as `uow`
+    The session is only opened if a handler touches the database.
+    Handlers commit before talking to Telegram to release the connection
+    early; whatever is left is committed here, or rolled back on error.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        uow = db.unit_of_work()
+        data["uow"] = uow
+        try:
+            result = await handler(event, data)
+        except Exception:
+            await uow.rollback()
+            raise
+        await uow.commit()
+        return result
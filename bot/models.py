@@ -1,7 +1,7 @@
 """Database models"""
 
-from datetime import datetime
-from sqlalchemy import BigInteger, String, Integer, ForeignKey, UniqueConstraint, Date
+from datetime import date, datetime
+from sqlalchemy import BigInteger, String, Integer, ForeignKey, UniqueConstraint, Date, Index, Text, DateTime, Float
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from typing import List
 
@@ -65,4 +65,84 @@ class ChatUser(Base):
     
     __table_args__ = (
         UniqueConstraint('chat_id', 'user_id', name='unique_chat_user'),
+        # Per-user lookups across all chats (/me)
+        Index('ix_chat_user_user_id', 'user_id', 'chat_id'),
     )
+
+
+class BroadcastJob(Base):
+    """Broadcast job model"""
+    __tablename__ = "broadcast_jobs"
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    text: Mapped[str] = mapped_column(Text)
+    author_id: Mapped[int] = mapped_column(BigInteger)
+    status: Mapped[str] = mapped_column(String(16), default="running")  # running, done
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    finished_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class BroadcastDelivery(Base):
+    """Per-chat broadcast progress model"""
+    __tablename__ = "broadcast_deliveries"
+    
+    job_id: Mapped[int] = mapped_column(Integer, ForeignKey("broadcast_jobs.id"), primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    status: Mapped[str] = mapped_column(String(16))  # sent, failed
+    error: Mapped[str] = mapped_column(String(255), nullable=True)
+
+
+class ChatActivity(Base):
+    """Chat activity model: last command time, title and bot removal"""
+    __tablename__ = "chat_activity"
+    
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    last_active_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    title: Mapped[str] = mapped_column(String(255), nullable=True)
+    removed_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
+
+class ChatMemberDeparture(Base):
+    """Members who left a chat, pending archival"""
+    __tablename__ = "chat_member_departures"
+    
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    left_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+
+class ChatArchive(Base):
+    """Archived (inactive) chat model"""
+    __tablename__ = "chats_archive"
+    
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_of_the_day: Mapped[str] = mapped_column(String(255), nullable=True)
+    pidor_of_the_day: Mapped[str] = mapped_column(String(255), nullable=True)
+    user_of_the_day_run_day: Mapped[int] = mapped_column(Integer, nullable=True)
+    pidor_of_the_day_run_day: Mapped[int] = mapped_column(Integer, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+
+class ChatUserArchive(Base):
+    """Archived chat-user relationship model"""
+    __tablename__ = "chat_user_archive"
+    
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_day_counter: Mapped[int] = mapped_column(Integer, default=0)
+    pidor_counter: Mapped[int] = mapped_column(Integer, default=0)
+    reason: Mapped[str] = mapped_column(String(16))  # chat (archived with chat), left
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+
+class DrawRule(Base):
+    """Draw override rule: forced winner (weight is NULL) or weighted chance in date range"""
+    __tablename__ = "draw_rules"
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    game_type: Mapped[str] = mapped_column(String(32))
+    start_date: Mapped[date] = mapped_column(Date)
+    end_date: Mapped[date] = mapped_column(Date)  # inclusive
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("users.user_id"))
+    weight: Mapped[float] = mapped_column(Float, nullable=True)
@@ -2,11 +2,12 @@
 
 import asyncio
 import logging
+from datetime import date
 from sqlalchemy import select
 
 from bot.config import config
 from bot.database import Database
-from bot.models import User, Chat, ChatUser
+from bot.models import User, Chat, ChatUser, DrawRule
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -85,6 +86,12 @@ TEST_CHAT_ID = -5050482476  # Тестовый чат
 PROD_CHAT_ID = -1645180577  # Продакшн чат
 CHAT_IDS = [TEST_CHAT_ID, PROD_CHAT_ID]
 
+# Правила розыгрыша (бывший хардкод специального периода)
+# Формат: game_type, start_date, end_date, user_id, weight (None - гарантированный победитель)
+DRAW_RULES = [
+    ("pidor_of_the_day", date(2026, 2, 18), date(2026, 2, 25), 145778241, None),  # RussianBeerHunter
+]
+
 
 async def populate_database():
     """Populate database with initial data"""
@@ -159,6 +166,20 @@ async def populate_database():
                 f"User: {user_counter}, Pidor: {pidor_counter} (fake_id: {fake_user_id})"
             )
         
+        # Добавить правила розыгрыша для КАЖДОГО чата
+        for game_type, start_date, end_date, user_id, weight in DRAW_RULES:
+            for chat_id in CHAT_IDS:
+                rule = DrawRule(
+                    chat_id=chat_id,
+                    game_type=game_type,
+                    start_date=start_date,
+                    end_date=end_date,
+                    user_id=user_id,
+                    weight=weight
+                )
+                session.add(rule)
+            logger.info(f"Added draw rule: {game_type} {start_date}..{end_date} user {user_id}")
+        
         # Сохранить изменения
         await session.commit()
         logger.info("Database population completed successfully!")
@@ -0,0 +1,228 @@
+"""On-demand profiling of slow updates"""
+
+import cProfile
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.types import TelegramObject
+
+from bot.config import config
+
+logger = logging.getLogger(__name__)
+
+# Phase timings of the update being profiled, None when not profiled
+_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("profile_phases", default=None)
+# cProfile of the update being profiled, if it got one
+_profile: ContextVar[Optional[cProfile.Profile]] = ContextVar("profile_cprofile", default=None)
+
+
+def record_phase(name: str, seconds: float):
+    """Add time spent in phase to the current update, if it is profiled"""
+    phases = _phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + seconds
+
+
+def is_profiling() -> bool:
+    """Check if the current update is profiled"""
+    return _phases.get() is not None
+
+
+@contextmanager
+def unprofiled(phase: str):
+    """
+    Exclude an intentional wait (e.g. message delay) from cProfile
+    and record it as its own phase
+    """
+    profile = _profile.get()
+    if profile is not None:
+        profile.disable()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_phase(phase, time.perf_counter() - started)
+        if profile is not None:
+            profile.enable()
+
+
+class ProfileRecord:
+    """Profile of one update"""
+
+    def __init__(self, update_id: int, chat_id: Optional[int], duration: float,
+                 phases: Dict[str, float], profile: Optional[cProfile.Profile]):
+        self.update_id = update_id
+        self.chat_id = chat_id
+        self.duration = duration
+        self.phases = phases
+        self.profile = profile
+        self.created_at = datetime.now()
+
+    def describe(self) -> str:
+        """Get one-line summary"""
+        phases = ", ".join(f"{name} {seconds * 1000:.1f}ms" for name, seconds in sorted(self.phases.items()))
+        return (
+            f"update {self.update_id} chat {self.chat_id}: "
+            f"{self.duration * 1000:.1f}ms ({phases})"
+        )
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """
+    Profiles sampled updates and keeps the slowest ones
+    Switched off by default; when off it only checks one flag per update.
+    Phase timings (db_connect, db_query, db_commit, telegram, delay,
+    other) are collected for every sampled update and are the reliable
+    breakdown of where its time went.
+    cProfile runs for one update at a time, since profilers can not be
+    nested. It hooks the whole event loop thread, so while the handler
+    awaits, everything else the loop runs (other updates, polling, flush
+    loops, broadcast workers) is attributed to this update's .prof too.
+    Intentional waits wrapped in unprofiled() are excluded from it.
+    """
+
+    def __init__(self, keep: int = config.PROFILE_KEEP, dump_dir: str = config.PROFILE_DUMP_DIR):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.chat_id: Optional[int] = None
+        self.keep = keep
+        self.dump_dir = dump_dir
+        self._slowest: List[Tuple[float, int, ProfileRecord]] = []
+        self._counter = itertools.count()
+        self._profiler_busy = False
+
+    def enable(self, sample_rate: float = 1.0, chat_id: Optional[int] = None):
+        """Start profiling a share of updates, optionally only from one chat"""
+        self.sample_rate = sample_rate
+        self.chat_id = chat_id
+        self.enabled = True
+        logger.info(f"Profiling enabled: sample_rate={sample_rate}, chat_id={chat_id}")
+
+    def disable(self):
+        """Stop profiling"""
+        self.enabled = False
+        logger.info("Profiling disabled")
+
+    def toggle(self):
+        """Switch profiling on (all updates) or off"""
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def slowest(self) -> List[ProfileRecord]:
+        """Get kept records, slowest first"""
+        return [record for _, _, record in sorted(self._slowest, reverse=True)]
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if not self.enabled:
+            return await handler(event, data)
+
+        chat = data.get("event_chat")
+        chat_id = chat.id if chat else None
+        if self.chat_id is not None and chat_id != self.chat_id:
+            return await handler(event, data)
+        if random.random() >= self.sample_rate:
+            return await handler(event, data)
+
+        return await self._profile(handler, event, data, chat_id)
+
+    async def _profile(self, handler, event, data, chat_id):
+        """Run handler with phase timings and, if free, cProfile"""
+        phases: Dict[str, float] = {}
+        token = _phases.set(phases)
+        profile = None
+        if not self._profiler_busy:
+            self._profiler_busy = True
+            profile = cProfile.Profile()
+            profile.enable()
+        profile_token = _profile.set(profile)
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            duration = time.perf_counter() - started
+            if profile is not None:
+                profile.disable()
+                self._profiler_busy = False
+            _profile.reset(profile_token)
+            _phases.reset(token)
+            # Copy, so tasks spawned by the handler can not change a stored record
+            phases = dict(phases)
+            phases["other"] = max(duration - sum(phases.values()), 0.0)
+            self._keep(ProfileRecord(getattr(event, "update_id", 0), chat_id, duration, phases, profile))
+
+    def _keep(self, record: ProfileRecord):
+        """Keep record if it is among the slowest N"""
+        item = (record.duration, next(self._counter), record)
+        if len(self._slowest) < self.keep:
+            heapq.heappush(self._slowest, item)
+        else:
+            heapq.heappushpop(self._slowest, item)
+
+    def dump(self) -> List[str]:
+        """
+        Write kept records to dump_dir
+        Every update gets a .prof file (pstats, open with snakeviz/flameprof)
+        if it was cProfiled, plus one summary file. Returns written paths.
+        """
+        records = self.slowest()
+        if not records:
+            return []
+
+        os.makedirs(self.dump_dir, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        paths = []
+        for i, record in enumerate(records, 1):
+            if record.profile is not None:
+                path = os.path.join(self.dump_dir, f"{stamp}-{i:02d}-update{record.update_id}.prof")
+                record.profile.dump_stats(path)
+                paths.append(path)
+
+        summary = os.path.join(self.dump_dir, f"{stamp}-summary.txt")
+        with open(summary, "w") as f:
+            for i, record in enumerate(records, 1):
+                f.write(f"{i:02d} {record.created_at:%H:%M:%S} {record.describe()}\n")
+        paths.append(summary)
+        logger.info(f"Profile dumped to {self.dump_dir}: {len(paths)} file(s)")
+        return paths
+
+
+class TelegramTimingMiddleware(BaseRequestMiddleware):
+    """Records time spent in Bot API requests of profiled updates"""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot,
+        method: TelegramMethod
+    ):
+        if not is_profiling():
+            return await make_request(bot, method)
+
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            record_phase("telegram", time.perf_counter() - started)
+
+
+# Global profiler instance
+profiler = ProfilingMiddleware()